@@ -40,6 +40,13 @@ To install required packages:
 $ pip3 install absl-py numpy pandas
 ```
 
+Optionally, install `numba` to compute the flow-volume curves and FEF values
+with the compiled kernels in `lib/curve_kernels.py`:
+
+```
+$ pip3 install numba
+```
+
 To generate the demo dataset:
 
 ```
@@ -59,13 +66,18 @@ add them to the `UKB_3066_RECORDS` list.
 """
 import os
 import pathlib
-from typing import Any, Sequence
+from typing import Any, Sequence, Union
 
 from absl import app
 from absl import flags
 import numpy as np
 import pandas as pd
 
+try:
+  from lib import curve_kernels  # pylint: disable=g-import-not-at-top
+except ImportError:
+  curve_kernels = None
+
 _OUT_DIR = flags.DEFINE_string(
     'out_dir',
     None,
@@ -99,1240 +111,21 @@ MAX_NUM_POINTS = 1000
 # `[0, MAX_INTERP_VOLUME]`.
 MAX_INTERP_VOLUME = 6.58
 
+# The volume values at which every flow-volume curve is interpolated: the x-axis
+# shared by all curves, computed once.
+INTERP_VOLUME_GRID = np.linspace(
+    0.0, MAX_INTERP_VOLUME, MAX_NUM_POINTS, dtype=np.float32
+)
+
 # The publicly available spirometry demo curve from UKB from field 3066:
 # https://biobank.ctsu.ox.ac.uk/crystal/field.cgi?id=3066
 UKB_DEMO_SPIRO_3066_BLOW_ORDER = 2
 UKB_DEMO_SPIRO_3066_BLOW_NUM_POINTS = 1224
-UKB_DEMO_SPIRO_3066_SERIES = np.asarray([
-    0,
-    0,
-    0,
-    0,
-    3,
-    10,
-    25,
-    54,
-    101,
-    169,
-    258,
-    363,
-    478,
-    589,
-    689,
-    785,
-    879,
-    970,
-    1059,
-    1147,
-    1234,
-    1320,
-    1403,
-    1486,
-    1569,
-    1650,
-    1730,
-    1809,
-    1888,
-    1965,
-    2040,
-    2116,
-    2188,
-    2261,
-    2331,
-    2400,
-    2465,
-    2532,
-    2595,
-    2658,
-    2720,
-    2780,
-    2838,
-    2894,
-    2948,
-    3001,
-    3052,
-    3102,
-    3151,
-    3197,
-    3243,
-    3287,
-    3329,
-    3371,
-    3412,
-    3451,
-    3490,
-    3527,
-    3564,
-    3600,
-    3635,
-    3670,
-    3703,
-    3736,
-    3769,
-    3800,
-    3831,
-    3861,
-    3890,
-    3918,
-    3947,
-    3974,
-    4001,
-    4028,
-    4054,
-    4080,
-    4105,
-    4130,
-    4154,
-    4179,
-    4202,
-    4226,
-    4249,
-    4271,
-    4292,
-    4312,
-    4332,
-    4351,
-    4371,
-    4390,
-    4408,
-    4426,
-    4444,
-    4461,
-    4478,
-    4495,
-    4512,
-    4528,
-    4544,
-    4560,
-    4575,
-    4590,
-    4604,
-    4619,
-    4633,
-    4647,
-    4661,
-    4675,
-    4689,
-    4703,
-    4716,
-    4729,
-    4742,
-    4755,
-    4767,
-    4779,
-    4791,
-    4802,
-    4812,
-    4822,
-    4831,
-    4840,
-    4849,
-    4857,
-    4866,
-    4874,
-    4882,
-    4890,
-    4898,
-    4906,
-    4914,
-    4921,
-    4929,
-    4936,
-    4944,
-    4951,
-    4958,
-    4966,
-    4973,
-    4980,
-    4987,
-    4994,
-    5000,
-    5007,
-    5013,
-    5020,
-    5026,
-    5033,
-    5039,
-    5045,
-    5051,
-    5057,
-    5063,
-    5069,
-    5075,
-    5081,
-    5087,
-    5092,
-    5098,
-    5104,
-    5109,
-    5114,
-    5119,
-    5125,
-    5130,
-    5134,
-    5139,
-    5144,
-    5148,
-    5153,
-    5157,
-    5161,
-    5166,
-    5170,
-    5174,
-    5178,
-    5182,
-    5186,
-    5190,
-    5194,
-    5198,
-    5202,
-    5205,
-    5209,
-    5213,
-    5216,
-    5220,
-    5223,
-    5226,
-    5230,
-    5233,
-    5236,
-    5240,
-    5243,
-    5246,
-    5250,
-    5253,
-    5256,
-    5259,
-    5262,
-    5264,
-    5267,
-    5270,
-    5273,
-    5276,
-    5279,
-    5283,
-    5286,
-    5289,
-    5292,
-    5295,
-    5298,
-    5300,
-    5303,
-    5306,
-    5308,
-    5311,
-    5314,
-    5316,
-    5319,
-    5321,
-    5323,
-    5326,
-    5328,
-    5331,
-    5333,
-    5335,
-    5338,
-    5340,
-    5343,
-    5345,
-    5348,
-    5350,
-    5352,
-    5355,
-    5357,
-    5360,
-    5362,
-    5365,
-    5367,
-    5369,
-    5372,
-    5374,
-    5377,
-    5379,
-    5381,
-    5384,
-    5386,
-    5388,
-    5390,
-    5391,
-    5393,
-    5395,
-    5397,
-    5399,
-    5401,
-    5403,
-    5404,
-    5406,
-    5408,
-    5410,
-    5412,
-    5413,
-    5415,
-    5417,
-    5419,
-    5420,
-    5422,
-    5424,
-    5426,
-    5427,
-    5429,
-    5431,
-    5432,
-    5434,
-    5436,
-    5438,
-    5439,
-    5441,
-    5443,
-    5444,
-    5446,
-    5447,
-    5449,
-    5450,
-    5452,
-    5453,
-    5455,
-    5456,
-    5457,
-    5459,
-    5460,
-    5461,
-    5462,
-    5463,
-    5464,
-    5466,
-    5467,
-    5468,
-    5470,
-    5471,
-    5473,
-    5474,
-    5476,
-    5477,
-    5478,
-    5480,
-    5481,
-    5482,
-    5484,
-    5485,
-    5486,
-    5487,
-    5489,
-    5490,
-    5491,
-    5492,
-    5493,
-    5494,
-    5496,
-    5497,
-    5498,
-    5499,
-    5500,
-    5501,
-    5502,
-    5503,
-    5504,
-    5505,
-    5506,
-    5507,
-    5508,
-    5509,
-    5510,
-    5510,
-    5511,
-    5512,
-    5513,
-    5514,
-    5515,
-    5515,
-    5516,
-    5517,
-    5519,
-    5520,
-    5521,
-    5523,
-    5524,
-    5525,
-    5527,
-    5529,
-    5530,
-    5532,
-    5533,
-    5535,
-    5536,
-    5537,
-    5539,
-    5540,
-    5541,
-    5543,
-    5544,
-    5545,
-    5545,
-    5546,
-    5547,
-    5548,
-    5549,
-    5549,
-    5550,
-    5551,
-    5552,
-    5552,
-    5553,
-    5554,
-    5554,
-    5555,
-    5556,
-    5557,
-    5557,
-    5558,
-    5559,
-    5560,
-    5560,
-    5561,
-    5562,
-    5562,
-    5563,
-    5564,
-    5564,
-    5565,
-    5565,
-    5566,
-    5567,
-    5567,
-    5568,
-    5569,
-    5570,
-    5571,
-    5572,
-    5573,
-    5574,
-    5576,
-    5577,
-    5578,
-    5579,
-    5580,
-    5582,
-    5583,
-    5584,
-    5585,
-    5587,
-    5588,
-    5589,
-    5590,
-    5591,
-    5591,
-    5592,
-    5593,
-    5594,
-    5595,
-    5596,
-    5596,
-    5597,
-    5598,
-    5598,
-    5599,
-    5600,
-    5601,
-    5601,
-    5602,
-    5603,
-    5603,
-    5604,
-    5605,
-    5606,
-    5606,
-    5607,
-    5608,
-    5608,
-    5609,
-    5609,
-    5609,
-    5610,
-    5611,
-    5611,
-    5612,
-    5613,
-    5613,
-    5614,
-    5615,
-    5616,
-    5616,
-    5617,
-    5618,
-    5618,
-    5619,
-    5620,
-    5621,
-    5622,
-    5623,
-    5624,
-    5624,
-    5625,
-    5626,
-    5626,
-    5627,
-    5628,
-    5628,
-    5629,
-    5629,
-    5630,
-    5630,
-    5631,
-    5632,
-    5632,
-    5633,
-    5633,
-    5634,
-    5635,
-    5635,
-    5636,
-    5637,
-    5637,
-    5638,
-    5639,
-    5639,
-    5640,
-    5641,
-    5642,
-    5642,
-    5643,
-    5644,
-    5645,
-    5645,
-    5646,
-    5647,
-    5647,
-    5648,
-    5649,
-    5649,
-    5650,
-    5651,
-    5651,
-    5652,
-    5652,
-    5653,
-    5654,
-    5654,
-    5655,
-    5656,
-    5656,
-    5657,
-    5658,
-    5658,
-    5659,
-    5660,
-    5660,
-    5661,
-    5661,
-    5662,
-    5663,
-    5663,
-    5664,
-    5664,
-    5665,
-    5665,
-    5666,
-    5666,
-    5667,
-    5667,
-    5668,
-    5668,
-    5669,
-    5669,
-    5670,
-    5670,
-    5670,
-    5671,
-    5671,
-    5672,
-    5672,
-    5672,
-    5673,
-    5673,
-    5673,
-    5673,
-    5674,
-    5674,
-    5674,
-    5675,
-    5676,
-    5676,
-    5677,
-    5677,
-    5678,
-    5678,
-    5679,
-    5679,
-    5680,
-    5681,
-    5681,
-    5682,
-    5683,
-    5683,
-    5684,
-    5684,
-    5685,
-    5686,
-    5686,
-    5687,
-    5687,
-    5688,
-    5688,
-    5688,
-    5689,
-    5689,
-    5690,
-    5690,
-    5690,
-    5691,
-    5691,
-    5692,
-    5692,
-    5692,
-    5693,
-    5693,
-    5694,
-    5694,
-    5694,
-    5695,
-    5695,
-    5695,
-    5696,
-    5696,
-    5696,
-    5696,
-    5696,
-    5696,
-    5697,
-    5697,
-    5698,
-    5698,
-    5698,
-    5699,
-    5699,
-    5699,
-    5699,
-    5700,
-    5700,
-    5700,
-    5701,
-    5701,
-    5702,
-    5702,
-    5703,
-    5703,
-    5704,
-    5704,
-    5705,
-    5705,
-    5706,
-    5706,
-    5707,
-    5707,
-    5708,
-    5709,
-    5709,
-    5710,
-    5710,
-    5711,
-    5711,
-    5712,
-    5712,
-    5712,
-    5713,
-    5713,
-    5713,
-    5714,
-    5714,
-    5714,
-    5715,
-    5715,
-    5716,
-    5716,
-    5716,
-    5717,
-    5717,
-    5717,
-    5718,
-    5718,
-    5719,
-    5719,
-    5720,
-    5720,
-    5721,
-    5721,
-    5721,
-    5722,
-    5722,
-    5722,
-    5723,
-    5723,
-    5723,
-    5723,
-    5724,
-    5724,
-    5724,
-    5725,
-    5725,
-    5725,
-    5726,
-    5726,
-    5726,
-    5727,
-    5727,
-    5728,
-    5728,
-    5729,
-    5729,
-    5729,
-    5730,
-    5730,
-    5731,
-    5732,
-    5732,
-    5733,
-    5733,
-    5734,
-    5735,
-    5735,
-    5735,
-    5736,
-    5736,
-    5736,
-    5737,
-    5737,
-    5737,
-    5738,
-    5738,
-    5738,
-    5739,
-    5739,
-    5739,
-    5739,
-    5740,
-    5740,
-    5740,
-    5741,
-    5741,
-    5741,
-    5741,
-    5741,
-    5741,
-    5742,
-    5742,
-    5742,
-    5742,
-    5742,
-    5742,
-    5742,
-    5742,
-    5742,
-    5742,
-    5741,
-    5741,
-    5740,
-    5740,
-    5740,
-    5740,
-    5739,
-    5739,
-    5739,
-    5739,
-    5739,
-    5739,
-    5740,
-    5740,
-    5740,
-    5741,
-    5742,
-    5742,
-    5743,
-    5743,
-    5744,
-    5745,
-    5745,
-    5745,
-    5746,
-    5746,
-    5747,
-    5747,
-    5748,
-    5748,
-    5748,
-    5748,
-    5748,
-    5748,
-    5749,
-    5749,
-    5749,
-    5749,
-    5749,
-    5749,
-    5749,
-    5750,
-    5750,
-    5750,
-    5750,
-    5750,
-    5751,
-    5751,
-    5751,
-    5752,
-    5752,
-    5753,
-    5753,
-    5754,
-    5754,
-    5754,
-    5755,
-    5755,
-    5756,
-    5756,
-    5756,
-    5757,
-    5757,
-    5757,
-    5758,
-    5758,
-    5758,
-    5758,
-    5759,
-    5759,
-    5759,
-    5759,
-    5759,
-    5759,
-    5759,
-    5759,
-    5759,
-    5760,
-    5760,
-    5760,
-    5761,
-    5761,
-    5761,
-    5762,
-    5762,
-    5763,
-    5763,
-    5763,
-    5764,
-    5764,
-    5764,
-    5765,
-    5765,
-    5766,
-    5766,
-    5766,
-    5767,
-    5767,
-    5767,
-    5767,
-    5767,
-    5768,
-    5768,
-    5768,
-    5768,
-    5769,
-    5769,
-    5769,
-    5770,
-    5770,
-    5770,
-    5770,
-    5770,
-    5771,
-    5771,
-    5771,
-    5771,
-    5771,
-    5772,
-    5772,
-    5772,
-    5773,
-    5773,
-    5773,
-    5774,
-    5774,
-    5774,
-    5775,
-    5775,
-    5775,
-    5776,
-    5776,
-    5777,
-    5777,
-    5777,
-    5778,
-    5778,
-    5778,
-    5778,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5780,
-    5780,
-    5780,
-    5780,
-    5780,
-    5780,
-    5780,
-    5780,
-    5780,
-    5780,
-    5780,
-    5780,
-    5780,
-    5780,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5779,
-    5780,
-    5780,
-    5780,
-    5780,
-    5781,
-    5781,
-    5781,
-    5782,
-    5782,
-    5782,
-    5783,
-    5783,
-    5783,
-    5784,
-    5784,
-    5784,
-    5785,
-    5785,
-    5785,
-    5785,
-    5785,
-    5786,
-    5786,
-    5786,
-    5786,
-    5786,
-    5786,
-    5786,
-    5787,
-    5787,
-    5787,
-    5788,
-    5788,
-    5788,
-    5789,
-    5789,
-    5789,
-    5790,
-    5790,
-    5790,
-    5791,
-    5791,
-    5792,
-    5792,
-    5792,
-    5793,
-    5793,
-    5793,
-    5794,
-    5794,
-    5795,
-    5795,
-    5795,
-    5796,
-    5796,
-    5796,
-    5797,
-    5797,
-    5798,
-    5798,
-    5798,
-    5798,
-    5798,
-    5799,
-    5799,
-    5799,
-    5799,
-    5800,
-    5800,
-    5800,
-    5801,
-    5801,
-    5801,
-    5801,
-    5802,
-    5802,
-    5802,
-    5802,
-    5803,
-    5803,
-    5803,
-    5803,
-    5803,
-    5803,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5803,
-    5804,
-    5804,
-    5804,
-    5804,
-    5804,
-    5805,
-    5805,
-    5805,
-    5805,
-    5806,
-    5806,
-    5806,
-    5806,
-    5806,
-    5806,
-    5806,
-    5806,
-    5806,
-    5806,
-    5807,
-    5807,
-    5807,
-    5807,
-    5808,
-    5808,
-    5809,
-    5809,
-    5809,
-    5810,
-    5810,
-    5810,
-    5811,
-    5811,
-    5812,
-    5812,
-    5813,
-    5813,
-    5813,
-    5814,
-    5814,
-    5815,
-    5815,
-    5815,
-    5815,
-    5816,
-    5816,
-    5816,
-    5816,
-    5817,
-    5817,
-    5817,
-    5817,
-    5817,
-    5817,
-    5817,
-    5818,
-    5818,
-    5818,
-    5818,
-    5818,
-    5818,
-    5818,
-    5819,
-    5819,
-    5819,
-    5819,
-    5819,
-    5819,
-    5819,
-    5819,
-    5819,
-    5819,
-    5820,
-    5820,
-    5820,
-    5820,
-    5820,
-    5820,
-    5820,
-    5820,
-    5820,
-    5819,
-    5820,
-    5820,
-    5820,
-    5820,
-    5820,
-    5820,
-    5820,
-    5820,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5821,
-    5820,
-    5820,
-    5820,
-    5819,
-    5819,
-    5818,
-    5818,
-    5818,
-    5817,
-    5817,
-    5817,
-    5816,
-    5816,
-    5816,
-    5816,
-    5815,
-    5815,
-    5815,
-    5816,
-    5816,
-    5816,
-    5817,
-    5817,
-    5818,
-    5819,
-    5819,
-    5820,
-    5821,
-    5822,
-    5823,
-    5823,
-    5824,
-    5825,
-    5826,
-    5827,
-    5827,
-    5828,
-    5828,
-    5829,
-    5829,
-    5829,
-    5830,
-    5830,
-    5831,
-    5831,
-    5831,
-    5831,
-    5831,
-    5832,
-    5831,
-    5832,
-    5832,
-    5832,
-    5832,
-    5832,
-    5832,
-    5832,
-    5833,
-    5833,
-    5833,
-    5833,
-    5833,
-    5833,
-    5833,
-    5834,
-    5834,
-    5834,
-    5834,
-    5834,
-    5835,
-    5835,
-    5835,
-    5835,
-    5835,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5836,
-    5835,
-    5835,
-    5835,
-    5835,
-    5834,
-    5834,
-    5834,
-    5834,
-    5833,
-    5833,
-    5833,
-    5833,
-    5833,
-    5832,
-    5832,
-    5832,
-    5832,
-    5832,
-    5832,
-    5832,
-    5832,
-    5831,
-])
+# The series itself is stored as an int16 `npy` file next to this module; all
+# of its values (in ML) fit in int16.
+UKB_DEMO_SPIRO_3066_SERIES = np.load(
+    pathlib.Path(__file__).with_name('ukb_3066_demo.series.npy')
+)
 
 # The expected keys used to define a spirometry blow record.
 SPIRO_RECORD_EID_KEY = 'eid'
@@ -1353,14 +146,33 @@ UKB_3066_RECORDS = [{
 }]
 
 
-def trim_records(records: list[dict[str, Any]]) -> pd.DataFrame:
-  """Trims leading zeros from spirometry series to match blow length.
+def trim_series(series: np.ndarray, num_points: int) -> np.ndarray:
+  """Trims leading zeros from a spirometry series to match blow length.
 
   Each blow is left-padded with a constant number of `num_zero` 0s where
   `len(series) = num_zeros + num_points`. We drop the first `num_zeros-1`
   zeros, keeping the final zero to capture the change in flow from time
   step `t=0` to time step `t=1`.
 
+  Args:
+    series: The blow series.
+    num_points: The number of points in the blow.
+
+  Returns:
+    The trimmed series, of length `num_points + 1`.
+  """
+  num_zeros = len(series) - num_points
+  assert {0} == set(series[:num_zeros])
+  trimmed_series = series[-(num_points + 1) :]
+  assert 0 == trimmed_series[0]
+  return trimmed_series
+
+
+def trim_records(records: list[dict[str, Any]]) -> pd.DataFrame:
+  """Trims leading zeros from spirometry series to match blow length.
+
+  See `trim_series` for details.
+
   Args:
     records: A list of record dictionaries representing individual blows.
 
@@ -1369,19 +181,16 @@ def trim_records(records: list[dict[str, Any]]) -> pd.DataFrame:
   """
 
   for record in records:
-    series = record[SPIRO_RECORD_SERIES_KEY]
-    num_points = record[SPIRO_RECORD_BLOW_NUM_POINTS_KEY]
-    num_zeros = len(series) - num_points
-    assert {0} == set(series[:num_zeros])
-    trimmed_series = series[-(num_points + 1) :]
-    assert 0 == trimmed_series[0]
-    record[SPIRO_RECORD_SERIES_KEY] = trimmed_series
+    record[SPIRO_RECORD_SERIES_KEY] = trim_series(
+        record[SPIRO_RECORD_SERIES_KEY],
+        record[SPIRO_RECORD_BLOW_NUM_POINTS_KEY],
+    )
   return pd.DataFrame(records)
 
 
 def compute_volume(series: np.ndarray, volume_scale: float) -> np.ndarray:
   """Rescale `series` to a liter-based volume curve."""
-  return (series * volume_scale).astype(np.float32)
+  return np.multiply(series, volume_scale, dtype=np.float32)
 
 
 def compute_flow(volume: np.ndarray, time_scale: float) -> np.ndarray:
@@ -1391,48 +200,89 @@ def compute_flow(volume: np.ndarray, time_scale: float) -> np.ndarray:
   right padding to avoid large negative flow values if zero-padded.
 
   Args:
-    volume: The volume-time curve.
+    volume: The volume-time curve, or a 2-D array of volume-time curves with one
+      curve per row.
     time_scale: The relative time scale, in seconds (i.e., input volume unit per
       second).
 
   Returns:
-    A numpy array representing the corresponding flow curve.
+    A numpy array representing the corresponding flow curve(s).
   """
-  return np.concatenate(([0.0], np.diff(volume) / time_scale))
+  # Note: `np.diff(volume, prepend=0)` concatenates the prepended value onto a
+  # copy of `volume` before differencing, so instead the differences are written
+  # straight into the output behind a leading zero and scaled in place.
+  flow = np.empty_like(volume)
+  flow[..., 0] = 0
+  np.subtract(volume[..., 1:], volume[..., :-1], out=flow[..., 1:])
+  flow /= time_scale
+  return flow
+
+
+def stack_series(
+    series_list: Sequence[np.ndarray],
+) -> tuple[np.ndarray, np.ndarray]:
+  """Stacks variable-length blow series into a single 2-D array.
+
+  Series shorter than the longest one are right-padded with their last value.
+  This leaves the maximum of each row unchanged and yields zero flow in the
+  padded region.
+
+  Args:
+    series_list: The blow series, one per record.
+
+  Returns:
+    A tuple (stacked, lengths) where `stacked` has shape
+    `(len(series_list), max(lengths))` and `lengths` holds the original length
+    of each series.
+  """
+  lengths = np.array([len(series) for series in series_list])
+  stacked = np.empty(
+      (len(series_list), lengths.max()),
+      dtype=np.result_type(*series_list),
+  )
+  for i, series in enumerate(series_list):
+    stacked[i, : lengths[i]] = series
+    stacked[i, lengths[i] :] = series[-1]
+  return stacked, lengths
 
 
 def derive_base_curves(
     df: pd.DataFrame,
     volume_scale: float = VOLUME_SCALE,
     time_scale: float = TIME_SCALE,
-) -> pd.DataFrame:
-  """Derives the base time, volume, and flow curves from a blow series."""
-  # Note: We copy the df so that we can rerun this function on the original df.
-  df = df.copy()
-
-  # Compute unpadded volume curve, max volume value, and last volume value.
-  df['volume'] = df['series'].apply(
-      lambda series: compute_volume(  # pylint: disable=g-long-lambda
-          series,
-          volume_scale,
-      )
-  )
-  df['volume_max'] = df['volume'].apply(np.max)
-  df['volume_last'] = df['volume'].apply(lambda volume: volume[-1])
-
-  # Compute unpadded flow curve, max flow value, and last flow value.
-  df['flow'] = df['volume'].apply(
-      lambda volume: compute_flow(  # pylint: disable=g-long-lambda
-          volume,
-          time_scale,
-      )
-  )
-  df['flow_max'] = df['flow'].apply(np.max)
-  df['flow_last'] = df['flow'].apply(lambda flow: flow[-1])
+) -> tuple[pd.DataFrame, dict[str, np.ndarray]]:
+  """Derives the base time, volume, and flow curves from a blow series.
+
+  Args:
+    df: The dataframe containing the trimmed blow series.
+    volume_scale: The volume scale applied to series points.
+    time_scale: The scale of each time step in seconds.
+
+  Returns:
+    A tuple (df, curves). `df` holds per-blow scalar values, including the
+    length of each unpadded curve in `series_length`. `curves` maps `volume`
+    and `flow` to 2-D arrays with one unpadded curve per row; rows of blows
+    shorter than the longest one are right-padded as in `stack_series`.
+  """
+  # Note: columns are added to `df` in place; callers that need to rerun this
+  # function on the original df should pass a copy.
+
+  # Compute unpadded volume and flow curves for all blows at once.
+  series, lengths = stack_series(df['series'].to_list())
+  volume = compute_volume(series, volume_scale)
+  flow = compute_flow(volume, time_scale)
+
+  # Compute max and last volume and flow values.
+  rows = np.arange(len(df))
+  df['series_length'] = lengths
+  df['volume_max'] = volume.max(axis=1)
+  df['volume_last'] = volume[rows, lengths - 1]
+  df['flow_max'] = flow.max(axis=1)
+  df['flow_last'] = flow[rows, lengths - 1]
 
   df = df.drop(columns=['series'])
 
-  return df
+  return df, {'volume': volume, 'flow': flow}
 
 
 def right_pad_array(
@@ -1454,14 +304,38 @@ def right_pad_array(
   Returns:
     A padded array of length `max_num_points`.
   """
-  array = array[: min(len(array), max_num_points)]
-  array = np.pad(
-      array,
-      (0, max_num_points - len(array)),
-      mode='constant',
-      constant_values=pad_value,
-  )
-  return array
+  num_points = min(len(array), max_num_points)
+  padded = np.full(max_num_points, pad_value, dtype=array.dtype)
+  padded[:num_points] = array[:num_points]
+  return padded
+
+
+def right_pad_batch(
+    arrays: np.ndarray,
+    lengths: np.ndarray,
+    pad_values: Union[float, np.ndarray],
+    max_num_points: int,
+) -> np.ndarray:
+  """Right pads each row of `arrays` up to `max_num_points`.
+
+  This is the batched equivalent of `right_pad_array`: the output is allocated
+  once and pre-filled with the padding values, and each row's (possibly
+  truncated) prefix of length `lengths[i]` is then copied into it.
+
+  Args:
+    arrays: A 2-D array with one target curve per row.
+    lengths: The length of the curve in each row; values past it are ignored.
+    pad_values: The padding value, either shared by all rows or given per row.
+    max_num_points: The target length of the padded rows.
+
+  Returns:
+    A float32 array of shape `(len(arrays), max_num_points)`.
+  """
+  padded = np.empty((len(arrays), max_num_points), dtype=np.float32)
+  padded[:] = np.reshape(pad_values, (-1, 1))
+  for i, length in enumerate(np.minimum(lengths, max_num_points)):
+    padded[i, :length] = arrays[i, :length]
+  return padded
 
 
 def compute_time(max_num_points: int, time_scale: float) -> np.ndarray:
@@ -1478,72 +352,91 @@ def compute_time(max_num_points: int, time_scale: float) -> np.ndarray:
 def compute_flow_volume(
     flow: np.ndarray,
     volume: np.ndarray,
-    min_volume: float,
-    max_volume: float,
-    num_points: int,
+    grid: np.ndarray = INTERP_VOLUME_GRID,
 ) -> np.ndarray:
-  """Interpolates a flow_volume curve of `num_points`."""
-  monotonic_volume = np.maximum.accumulate(volume)
-  # Note: this guard ensures that the `xp` argument passed to np.interp is non-
-  # increasing. From the documentation: "if the sequence `xp` is non-increasing,
-  # interpolation results are meaningless." We relax the strict non-increasing
-  # requirement to non-decreasing, as this gives extremely similar results to
-  # breaking ties with a small amount of noise (i.e., adding the following to
-  # the monotonic curve: `np.linspace(start=1e-4, stop=1e-3, num=num_points)`.
-  assert np.all(np.diff(monotonic_volume) >= 0)
-
-  volume_interp_intervals = np.linspace(
-      start=min_volume, stop=max_volume, num=num_points
-  )
-  flow_interp = np.interp(
-      volume_interp_intervals, xp=monotonic_volume, fp=flow, left=0, right=0
-  )
+  """Interpolates a flow_volume curve at `grid` for each row of `flow`."""
+  # Note: the running maximum ensures that the `xp` argument passed to np.interp
+  # is non-decreasing. From the documentation: "if the sequence `xp` is non-
+  # increasing, interpolation results are meaningless." We relax the strict
+  # non-increasing requirement to non-decreasing, as this gives extremely
+  # similar results to breaking ties with a small amount of noise (i.e., adding
+  # the following to the monotonic curve:
+  # `np.linspace(start=1e-4, stop=1e-3, num=len(grid))`.
+  monotonic_volume = np.maximum.accumulate(volume, axis=1)
+
+  flow_interp = np.empty((len(flow), len(grid)), dtype=np.float32)
+  for i in range(len(flow)):
+    flow_interp[i] = np.interp(
+        grid,
+        xp=monotonic_volume[i],
+        fp=flow[i],
+        left=0,
+        right=0,
+    )
   return flow_interp
 
 
 def compute_fef(
-    flow: np.ndarray, volume: np.ndarray, volume_max: float
-) -> tuple[float, float, float, float]:
-  """Computes FEF (forced expiratory flow) values.
+    flow: np.ndarray,
+    volume: np.ndarray,
+    volume_max: np.ndarray,
+) -> np.ndarray:
+  """Computes FEF (forced expiratory flow) values for each blow.
 
   Computes FEF25%, FEF50%, FEF75%, and FEF25-75% values.
   See https://en.wikipedia.org/wiki/Spirometry#Forced_expiratory_flow_(FEF) for
   details.
 
   Args:
-    flow: The flow series.
-    volume: The volume series.
-    volume_max: The maximum volume (FVC) value.
+    flow: The flow series, one per row. Rows may be right-padded with `0`.
+    volume: The volume series, one per row. Rows may be right-padded with their
+      last value, which leaves the FEF values unchanged.
+    volume_max: The maximum volume (FVC) value of each blow.
 
   Returns:
-    A tuple (FEF25%, FEF50%, FEF75%, FEF25-75%).
+    An array of shape `(len(flow), 4)` whose columns are FEF25%, FEF50%, FEF75%,
+    and FEF25-75%.
   """
-  flow_size = len(flow)
-  assert flow_size == len(volume), 'Flow and Volume lengths do not match.'
+  flow_size = flow.shape[1]
+  assert flow.shape == volume.shape, 'Flow and Volume lengths do not match.'
   assert flow_size > 1, 'Flow should have more than one values'
-  volumes_over_25 = volume >= (0.25 * volume_max)
-  volumes_over_50 = volume >= (0.50 * volume_max)
-  volumes_over_75 = volume >= (0.75 * volume_max)
-  if not any(volumes_over_75):
-    raise ValueError(f'Cannot find FEF75 in volume curve: {volume}')
-
-  # Note np.argmax(..) finds the first True value in a boolean array.
-  idx_25 = np.argmax(volumes_over_25)
-  idx_50 = np.argmax(volumes_over_50)
-  idx_75 = np.argmax(volumes_over_75)
-  assert 0 <= idx_25 <= idx_50 <= idx_75 < flow_size
 
-  fef25, fef50, fef75 = flow[[idx_25, idx_50, idx_75]]
-  fef25_75 = flow[idx_25 : (idx_75 + 1)].mean()
-  return fef25, fef50, fef75, fef25_75
+  # Note: the first index at which a volume curve reaches a threshold is the
+  # left insertion point of that threshold in its (sorted) running maximum.
+  monotonic_volume = np.maximum.accumulate(volume, axis=1)
+  thresholds = np.outer(volume_max, [0.25, 0.50, 0.75])
+  indices = np.empty((len(flow), 3), dtype=np.intp)
+  for i in range(len(flow)):
+    indices[i] = np.searchsorted(
+        monotonic_volume[i], thresholds[i], side='left'
+    )
+  missing = indices[:, 2] == flow_size
+  if missing.any():
+    raise ValueError(
+        f'Cannot find FEF75 in volume curve: {volume[np.argmax(missing)]}'
+    )
+
+  # FEF25-75% is the mean flow over `[idx_25, idx_75]`, taken from the running
+  # sum of each flow curve.
+  rows = np.arange(len(flow))
+  idx_25, idx_75 = indices[:, 0], indices[:, 2]
+  cumulative_flow = np.zeros((len(flow), flow_size + 1))
+  np.cumsum(flow, axis=1, out=cumulative_flow[:, 1:])
+
+  fef = np.empty((len(flow), 4), dtype=np.float32)
+  fef[:, :3] = flow[rows[:, np.newaxis], indices]
+  fef[:, 3] = (
+      cumulative_flow[rows, idx_75 + 1] - cumulative_flow[rows, idx_25]
+  ) / (idx_75 - idx_25 + 1)
+  return fef
 
 
 def derive_input_representations(
     df: pd.DataFrame,
+    curves: dict[str, np.ndarray],
     max_num_points: int = MAX_NUM_POINTS,
     max_interp_volume: float = MAX_INTERP_VOLUME,
-    time_scale: float = TIME_SCALE,
-) -> pd.DataFrame:
+) -> tuple[pd.DataFrame, dict[str, np.ndarray]]:
   """Pads volume and flow to create ML model input representations.
 
   Note: Padding of both `0` or `row['volume_last']` is applied only when the
@@ -1553,7 +446,9 @@ def derive_input_representations(
   in the array is always the last value seen in the first `max_num_points`.
 
   Args:
-    df: The dataframe containing the unpadded volume-time and flow-time curves.
+    df: The dataframe containing per-blow scalar values.
+    curves: The unpadded `volume` and `flow` curves, as returned by
+      `derive_base_curves`.
     max_num_points: The length of the ML input representations. Curves larger
       than this value are truncated while curves shorter than this value are
       padded (volume is padded with either `0` or `volume_last`; flow is padded
@@ -1561,161 +456,210 @@ def derive_input_representations(
     max_interp_volume: The maximum volume value used when interpolating a
       flow-volume curve of length `max_num_points`. The x-axis on this curve is
       evenly sampled points from `[0, max_interp_volume]`.
-    time_scale: The scale of each time step in seconds.
 
   Returns:
-    A dataframe consisting of derived input representations.
+    A tuple (df, curves) where `df` additionally holds the FEF values and
+    `curves` maps `volume_pad_zero`, `volume_pad_last`, `flow_pad_zero`, and
+    `flow_volume_pad_zero` to 2-D arrays of shape `(len(df), max_num_points)`.
   """
-  # Note: We copy the df so that we can rerun this function on the original df.
-  df = df.copy()
+  # Note: columns are added to `df` in place; callers that need to rerun this
+  # function on the original df should pass a copy.
 
-  # Compute time. Note: we use an empty apply so that we can get around pandas
-  # trying to unpack the `time_curve`.
-  df.loc[:, 'time'] = np.NaN
-  time_curve = compute_time(max_num_points, time_scale)
-  df['time'] = df['time'].apply(lambda _: time_curve)
+  volume = curves['volume']
+  flow = curves['flow']
+  lengths = df['series_length'].to_numpy()
 
   # Compute padded volume curves.
-  df['volume_pad_zero'] = df.apply(
-      lambda row: right_pad_array(  # pylint: disable=g-long-lambda
-          row['volume'],
-          pad_value=0,
-          max_num_points=max_num_points,
-      ),
-      axis=1,
+  volume_pad_zero = right_pad_batch(
+      volume, lengths, pad_values=0, max_num_points=max_num_points
   )
-  df['volume_pad_last'] = df.apply(
-      lambda row: right_pad_array(  # pylint: disable=g-long-lambda
-          row['volume'],
-          pad_value=row['volume_last'],
-          max_num_points=max_num_points,
-      ),
-      axis=1,
+  volume_pad_last = right_pad_batch(
+      volume,
+      lengths,
+      pad_values=df['volume_last'].to_numpy(),
+      max_num_points=max_num_points,
   )
 
   # Compute padded flow curve.
-  df['flow_pad_zero'] = df.apply(
-      lambda row: right_pad_array(  # pylint: disable=g-long-lambda
-          row['flow'],
-          pad_value=0,
-          max_num_points=max_num_points,
-      ),
-      axis=1,
+  flow_pad_zero = right_pad_batch(
+      flow, lengths, pad_values=0, max_num_points=max_num_points
   )
 
-  # Compute padded flow volume curves.
-  df['flow_volume_pad_zero'] = df.apply(
-      lambda row: compute_flow_volume(  # pylint: disable=g-long-lambda
-          row['flow_pad_zero'],
-          row['volume_pad_zero'],
-          min_volume=0,
-          max_volume=max_interp_volume,
-          num_points=max_num_points,
-      ),
-      axis=1,
-  )
+  # Compute padded flow volume curves and FEF values.
+  if (max_interp_volume, max_num_points) == (MAX_INTERP_VOLUME, MAX_NUM_POINTS):
+    grid = INTERP_VOLUME_GRID
+  else:
+    grid = np.linspace(0.0, max_interp_volume, max_num_points, dtype=np.float32)
+  volume_max = df['volume_max'].to_numpy()
+  if curve_kernels is not None:
+    flow_volume_pad_zero, fef = curve_kernels.compute_flow_volume_and_fef(
+        flow_pad_zero, volume_pad_zero, flow, volume, volume_max, grid
+    )
+  else:
+    flow_volume_pad_zero = compute_flow_volume(
+        flow_pad_zero, volume_pad_zero, grid=grid
+    )
+    fef = compute_fef(flow, volume, volume_max)
+
+  df[['blow_fef25', 'blow_fef50', 'blow_fef75', 'blow_fef25_75']] = fef
+
+  return df, {
+      'volume_pad_zero': volume_pad_zero,
+      'volume_pad_last': volume_pad_last,
+      'flow_pad_zero': flow_pad_zero,
+      'flow_volume_pad_zero': flow_volume_pad_zero,
+  }
 
-  df['blow_fef25'], df['blow_fef50'], df['blow_fef75'], df['blow_fef25_75'] = (
-      df.apply(
-          lambda row: compute_fef(  # pylint: disable=g-long-lambda
-              row['flow'], row['volume'], row['volume_max']
-          ),
-          axis=1,
-          result_type='expand',
-      ).T.values
-  )
 
-  df = df.drop(columns=['volume', 'flow'])
-  return df
+def write_npy_file(
+    filepath: pathlib.Path, channels: Sequence[np.ndarray], duplicates: int
+) -> None:
+  """Writes `channels`, stacked along a new last dimension, as an `npy` file.
 
+  Every row is repeated `duplicates` times in a row (as with
+  `np.repeat(..., axis=0)`). The output is memory-mapped and each channel is
+  broadcast straight into it, so neither the stacked array nor the repeated
+  rows are ever held in memory.
 
-def get_time_flow_volume_np(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
-  flow_np = np.array(df['flow_pad_zero'].to_list())
-  volume_np = np.array(df['volume_pad_last'].to_list())
-  return flow_np, volume_np
+  Args:
+    filepath: The path of the output `npy` file.
+    channels: The float32 curves to write, each of shape `(num_rows,
+      num_points)`.
+    duplicates: The number of copies of each row to write.
+  """
+  num_rows, num_points = channels[0].shape
+  npy = np.lib.format.open_memmap(
+      filepath,
+      mode='w+',
+      dtype=np.float32,
+      shape=(num_rows * duplicates, num_points, len(channels)),
+  )
+  rows = npy.reshape(num_rows, duplicates, num_points, len(channels))
+  for i, channel in enumerate(channels):
+    assert channel.dtype == np.float32
+    assert channel.shape == (num_rows, num_points)
+    rows[..., i] = channel[:, np.newaxis]
+  npy.flush()
+  del rows, npy
+
+
+def derive_single_record_curves(
+    record: dict[str, Any],
+) -> dict[str, np.ndarray]:
+  """Derives the padded input curves of a single blow record.
+
+  This is a fast path equivalent to running `trim_records`,
+  `derive_base_curves`, and `derive_input_representations` on `[record]`: it
+  works on the blow's 1-D curves directly, without building a dataframe.
+  `record` itself is not modified. The module-level scales and sizes are used
+  throughout, and FEF values are not computed since they are not part of the
+  `npy` dataset files.
 
+  Args:
+    record: A record dictionary representing a single blow.
 
-def join_flow_volume_in_channel(
-    flow_np: np.ndarray,
-    volume_np: np.ndarray,
-) -> np.ndarray:
-  flow_np_exp = np.expand_dims(flow_np, axis=2)
-  volume_np_exp = np.expand_dims(volume_np, axis=2)
-  return np.concatenate((flow_np_exp, volume_np_exp), axis=2)
+  Returns:
+    A dictionary of padded curves with the same keys as those returned by
+    `derive_input_representations`, each of shape `(1, MAX_NUM_POINTS)`.
+  """
+  series = trim_series(
+      record[SPIRO_RECORD_SERIES_KEY], record[SPIRO_RECORD_BLOW_NUM_POINTS_KEY]
+  )
+  volume = compute_volume(series, VOLUME_SCALE)
+  flow = compute_flow(volume, TIME_SCALE)
+
+  volume_pad_zero = right_pad_array(volume, 0, MAX_NUM_POINTS)
+  volume_pad_last = right_pad_array(volume, volume[-1], MAX_NUM_POINTS)
+  flow_pad_zero = right_pad_array(flow, 0, MAX_NUM_POINTS)
+  flow_volume_pad_zero = compute_flow_volume(
+      flow_pad_zero[np.newaxis], volume_pad_zero[np.newaxis]
+  )
+
+  return {
+      'volume_pad_zero': volume_pad_zero[np.newaxis],
+      'volume_pad_last': volume_pad_last[np.newaxis],
+      'flow_pad_zero': flow_pad_zero[np.newaxis],
+      'flow_volume_pad_zero': flow_volume_pad_zero,
+  }
 
 
-def get_flow_by_volume_np(df: pd.DataFrame) -> np.ndarray:
-  return np.expand_dims(np.array(df['flow_volume_pad_zero'].to_list()), axis=2)
+def build_and_write_npy_files(
+    curves: dict[str, np.ndarray],
+    duplicates: int,
+    out_dir: pathlib.Path,
+) -> None:
+  """Converts `curves` into SPINCs `npy` dataset files in `out_dir`.
 
+  Each file is built in place in a memory-mapped output (see `write_npy_file`),
+  so no output array is held in memory.
 
-def build_npy_files(df: pd.DataFrame, duplicates: int) -> dict[str, np.ndarray]:
-  """Converts `df` into numpy arrays suitable for SPINCs `npy` dataset files."""
+  Args:
+    curves: The padded curves, as returned by `derive_input_representations`.
+    duplicates: The number of duplicates of each blow to write.
+    out_dir: The path of the output directory.
+  """
   assert duplicates >= 1
+  os.makedirs(out_dir, exist_ok=True)
+  flow_np = curves['flow_pad_zero']
+  volume_np = curves['volume_pad_last']
+  flow_volume_np = curves['flow_volume_pad_zero']
+  assert flow_np.shape == volume_np.shape == flow_volume_np.shape
+  assert flow_np.shape[1] == 1000
+  num_blows = len(flow_np)
+
   # Stack the flow_by_time and volume_by_time curves along the last dimension.
-  flow_np, volume_np = get_time_flow_volume_np(df)
-  flow_and_volume_np = join_flow_volume_in_channel(flow_np, volume_np)
+  write_npy_file(
+      out_dir / 'ukb_3066_demo.flow_volume_in_channels.npy',
+      (flow_np, volume_np),
+      duplicates,
+  )
 
   # Parse just the flow_by_volume curve.
-  flow_by_volume_np = get_flow_by_volume_np(df)
+  write_npy_file(
+      out_dir / 'ukb_3066_demo.flow_by_volume_one_channel.npy',
+      (flow_volume_np,),
+      duplicates,
+  )
 
   # Parse just the volume_by_time curve.
-  volume_by_time_np = np.expand_dims(volume_np, axis=2)
+  write_npy_file(
+      out_dir / 'ukb_3066_demo.volume_by_time_one_channel.npy',
+      (volume_np,),
+      duplicates,
+  )
 
   # Stack the flow_by_time, volume_by_time, and flow_by_volume curves along the
   # last dimension.
-  three_curves_np = np.concatenate(
-      (flow_and_volume_np, flow_by_volume_np),
-      axis=-1,
+  write_npy_file(
+      out_dir / 'ukb_3066_demo.three_curves_in_channels.npy',
+      (flow_np, volume_np, flow_volume_np),
+      duplicates,
   )
 
-  if duplicates > 1:
-    flow_and_volume_np = np.repeat(flow_and_volume_np, duplicates, axis=0)
-    flow_by_volume_np = np.repeat(flow_by_volume_np, duplicates, axis=0)
-    volume_by_time_np = np.repeat(volume_by_time_np, duplicates, axis=0)
-    three_curves_np = np.repeat(three_curves_np, duplicates, axis=0)
-
   # Placeholder numpy array of derived features, all zeros.
-  derived_features = np.zeros(shape=(len(df) * duplicates, 5), dtype=float)
-
-  assert flow_and_volume_np.shape == (len(df) * duplicates, 1000, 2)
-  assert flow_by_volume_np.shape == (len(df) * duplicates, 1000, 1)
-  assert volume_by_time_np.shape == (len(df) * duplicates, 1000, 1)
-  assert three_curves_np.shape == (len(df) * duplicates, 1000, 3)
-  assert derived_features.shape == (len(df) * duplicates, 5)
-
-  filename_to_contents = {
-      'ukb_3066_demo.flow_volume_in_channels.npy': flow_and_volume_np,
-      'ukb_3066_demo.flow_by_volume_one_channel.npy': flow_by_volume_np,
-      'ukb_3066_demo.volume_by_time_one_channel.npy': volume_by_time_np,
-      'ukb_3066_demo.three_curves_in_channels.npy': three_curves_np,
-      'ukb_3066_demo.derived_features.npy': derived_features,
-  }
-
-  return filename_to_contents
-
-
-def write_npy_files(
-    out_dir: pathlib.Path, filename_to_contents: dict[str, np.ndarray]
-) -> None:
-  """Writes each `np.ndarray` as an `npy` file in `out_dir`."""
-  os.makedirs(out_dir, exist_ok=True)
-  filepath_to_contents = {
-      out_dir / filename: contents
-      for filename, contents in filename_to_contents.items()
-  }
-  for filepath, contents in filepath_to_contents.items():
-    with open(filepath, 'wb') as f:
-      np.save(f, contents)
+  derived_features = np.lib.format.open_memmap(
+      out_dir / 'ukb_3066_demo.derived_features.npy',
+      mode='w+',
+      dtype=np.float32,
+      shape=(num_blows * duplicates, 5),
+  )
+  derived_features[:] = 0
+  derived_features.flush()
+  del derived_features
 
 
 def main(unused_argv: Sequence[str]) -> None:
-  trimmed_records_df = trim_records(UKB_3066_RECORDS)
-  base_curve_dfs = derive_base_curves(trimmed_records_df)
-  blow_curve_derived_df = derive_input_representations(base_curve_dfs)
-  filename_to_contents = build_npy_files(
-      blow_curve_derived_df, duplicates=_DUPLICATES.value
+  if len(UKB_3066_RECORDS) == 1:
+    blow_curves = derive_single_record_curves(UKB_3066_RECORDS[0])
+  else:
+    trimmed_records_df = trim_records(UKB_3066_RECORDS)
+    base_curve_df, base_curves = derive_base_curves(trimmed_records_df)
+    _, blow_curves = derive_input_representations(base_curve_df, base_curves)
+  build_and_write_npy_files(
+      blow_curves,
+      duplicates=_DUPLICATES.value,
+      out_dir=pathlib.Path(_OUT_DIR.value),
   )
-  write_npy_files(pathlib.Path(_OUT_DIR.value), filename_to_contents)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,168 @@
+"""Numba kernels for deriving spirometry input representations.
+
+These kernels compute the flow-volume curve and FEF values of every blow in a
+single compiled pass, parallelized across blows. They are optional: importing
+this module requires `numba`, and callers fall back to the NumPy implementation
+in `generate_ukb_3066_demo_dataset.py` when it is not installed.
+"""
+import numba
+import numpy as np
+
+
+@numba.njit(cache=True, fastmath=True)
+def _interp_row(
+    grid: np.ndarray, xp: np.ndarray, fp: np.ndarray, out: np.ndarray
+) -> None:
+  """Writes `np.interp(grid, xp, fp, left=0, right=0)` into `out`.
+
+  Both `grid` and `xp` are non-decreasing, so the interval containing each grid
+  point is found by sweeping forward through `xp` rather than by a binary
+  search. Ties in `xp` resolve to the last tied point, as in `np.interp`.
+
+  Args:
+    grid: The non-decreasing x-coordinates at which to interpolate.
+    xp: The non-decreasing x-coordinates of the data points.
+    fp: The y-coordinates of the data points.
+    out: The output array, of the same length as `grid`.
+  """
+  num_xp = xp.shape[0]
+  j = 0
+  for k in range(grid.shape[0]):
+    x = np.float64(grid[k])
+    if x < xp[0] or x > xp[num_xp - 1]:
+      out[k] = 0.0
+      continue
+    while j + 1 < num_xp and xp[j + 1] <= x:
+      j += 1
+    if j == num_xp - 1 or xp[j] == x:
+      out[k] = fp[j]
+    else:
+      slope = (np.float64(fp[j + 1]) - fp[j]) / (np.float64(xp[j + 1]) - xp[j])
+      out[k] = slope * (x - xp[j]) + fp[j]
+
+
+@numba.njit(cache=True, fastmath=True)
+def _fef_row(
+    flow: np.ndarray, volume: np.ndarray, volume_max: float, out: np.ndarray
+) -> None:
+  """Writes (FEF25%, FEF50%, FEF75%, FEF25-75%) of one blow into `out`.
+
+  The running maximum of `volume` is swept once; the first index at which it
+  reaches each threshold is the first index at which `volume` does. If FEF75
+  cannot be found, `out` is filled with NaN.
+
+  Args:
+    flow: The flow series.
+    volume: The volume series.
+    volume_max: The maximum volume (FVC) value.
+    out: The output array of length 4.
+  """
+  thresholds = np.array([0.25, 0.50, 0.75]) * np.float64(volume_max)
+  indices = np.full(3, -1, dtype=np.int64)
+  num_found = 0
+  running_max = np.float64(volume[0])
+  for t in range(volume.shape[0]):
+    running_max = max(running_max, np.float64(volume[t]))
+    while num_found < 3 and running_max >= thresholds[num_found]:
+      indices[num_found] = t
+      num_found += 1
+    if num_found == 3:
+      break
+  if num_found < 3:
+    out[:] = np.nan
+    return
+
+  idx_25, idx_50, idx_75 = indices[0], indices[1], indices[2]
+  out[0] = flow[idx_25]
+  out[1] = flow[idx_50]
+  out[2] = flow[idx_75]
+  total = 0.0
+  for t in range(idx_25, idx_75 + 1):
+    total += flow[t]
+  out[3] = total / (idx_75 - idx_25 + 1)
+
+
+@numba.njit(parallel=True, cache=True, fastmath=True)
+def flow_volume_fef_kernel(
+    flow_pad_zero: np.ndarray,
+    volume_pad_zero: np.ndarray,
+    flow: np.ndarray,
+    volume: np.ndarray,
+    volume_max: np.ndarray,
+    grid: np.ndarray,
+    out_flow_volume: np.ndarray,
+    out_fef: np.ndarray,
+) -> None:
+  """Computes flow-volume curves and FEF values for all blows in parallel.
+
+  Args:
+    flow_pad_zero: The padded flow curves, one per row.
+    volume_pad_zero: The padded volume curves, one per row.
+    flow: The unpadded flow curves, one per row (right-padded with `0`).
+    volume: The unpadded volume curves, one per row (right-padded with their
+      last value).
+    volume_max: The maximum volume (FVC) value of each blow.
+    grid: The volume values at which each flow-volume curve is interpolated.
+    out_flow_volume: The output flow-volume curves, of shape
+      `(num_blows, len(grid))`.
+    out_fef: The output FEF values, of shape `(num_blows, 4)`.
+  """
+  for i in numba.prange(flow_pad_zero.shape[0]):
+    monotonic_volume = np.empty(volume_pad_zero.shape[1], dtype=np.float64)
+    running_max = np.float64(volume_pad_zero[i, 0])
+    for t in range(volume_pad_zero.shape[1]):
+      running_max = max(running_max, np.float64(volume_pad_zero[i, t]))
+      monotonic_volume[t] = running_max
+    _interp_row(grid, monotonic_volume, flow_pad_zero[i], out_flow_volume[i])
+    _fef_row(flow[i], volume[i], volume_max[i], out_fef[i])
+
+
+def compute_flow_volume_and_fef(
+    flow_pad_zero: np.ndarray,
+    volume_pad_zero: np.ndarray,
+    flow: np.ndarray,
+    volume: np.ndarray,
+    volume_max: np.ndarray,
+    grid: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+  """Computes flow-volume curves and FEF values with `flow_volume_fef_kernel`.
+
+  Matches `compute_flow_volume` and `compute_fef` in
+  `generate_ukb_3066_demo_dataset.py`.
+
+  Args:
+    flow_pad_zero: The padded flow curves, one per row.
+    volume_pad_zero: The padded volume curves, one per row.
+    flow: The unpadded flow curves, one per row.
+    volume: The unpadded volume curves, one per row.
+    volume_max: The maximum volume (FVC) value of each blow.
+    grid: The volume values at which each flow-volume curve is interpolated.
+
+  Returns:
+    A tuple (flow_volume, fef) of float32 arrays of shape
+    `(num_blows, len(grid))` and `(num_blows, 4)`.
+
+  Raises:
+    ValueError: If FEF75 cannot be found in a volume curve.
+  """
+  assert flow.shape == volume.shape, 'Flow and Volume shapes do not match.'
+  assert flow.shape[1] > 1, 'Flow should have more than one values'
+  num_blows = len(flow_pad_zero)
+  flow_volume = np.empty((num_blows, len(grid)), dtype=np.float32)
+  fef = np.empty((num_blows, 4), dtype=np.float32)
+  flow_volume_fef_kernel(
+      flow_pad_zero,
+      volume_pad_zero,
+      flow,
+      volume,
+      volume_max,
+      grid,
+      flow_volume,
+      fef,
+  )
+  missing = np.isnan(fef).any(axis=1)
+  if missing.any():
+    raise ValueError(
+        f'Cannot find FEF75 in volume curve: {volume[np.argmax(missing)]}'
+    )
+  return flow_volume, fef